@@ -2,7 +2,7 @@ import numpy as np
 
 from phi import struct, math
 from ._geom_util import assert_same_rank
-from ._geom import Geometry
+from ._geom import Geometry, cached
 from ._transform import rotate
 
 
@@ -25,9 +25,11 @@ class AbstractBox(Geometry):
     def upper(self):
         raise NotImplementedError(self)
 
+    @cached
     def bounding_radius(self):
         return math.max(self.size, axis=-1, keepdims=True) * 1.414214
 
+    @cached
     def bounding_half_extent(self):
         return self.size * 0.5
 
@@ -113,14 +115,17 @@ class AABox(AbstractBox):
             return None
 
     @struct.derived()
+    @cached
     def size(self):
         return self.upper - self.lower
 
     @struct.derived()
+    @cached
     def center(self):
         return 0.5 * (self.lower + self.upper)
 
     @struct.derived()
+    @cached
     def half_size(self):
         return self.size * 0.5
 
@@ -186,14 +191,17 @@ class Cuboid(AbstractBox):
             return None
 
     @struct.derived()
+    @cached
     def size(self):
         return 2 * self.half_size
 
     @struct.derived()
+    @cached
     def lower(self):
         return self.center - self.half_size
 
     @struct.derived()
+    @cached
     def upper(self):
         return self.center + self.half_size
 
@@ -26,8 +26,8 @@ class _NoGeometry(Geometry):
     def lies_inside(self, location):
         return math.tile(False, list(math.shape(location)[:-1]) + [1])
 
-    def approximate_fraction_inside(self, location, cell_size):
-        return math.tile(math.to_float(0), list(math.shape(location)[:-1]) + [1])
+    def approximate_fraction_inside_batch(self, centers, radii):
+        return math.tile(math.to_float(0), list(math.shape(centers)[:-1]) + [1])
 
     def shifted(self, delta):
         return self
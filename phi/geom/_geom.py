@@ -1,12 +1,48 @@
+import functools
+import itertools
 import warnings
 
+import numpy as np
+
 from phi import struct
 from phi import math
 
 
+def cached(method):
+    """
+    Decorator for argument-free Geometry methods and derived properties that only depend on the struct items.
+    Geometries are immutable, so the result is computed once per instance and reused by subsequent calls.
+    Copies created through `copied_with()`, e.g. by `shifted()` or `rotated()`, start with an empty cache.
+
+    :param method: function taking only `self`
+    :return: caching function
+    """
+    name = method.__name__
+
+    @functools.wraps(method)
+    def cached_method(self):
+        cache = self.__cache__
+        if cache is None:
+            cache = self.__cache__ = {}
+        if name not in cache:
+            cache[name] = method(self)
+        return cache[name]
+    return cached_method
+
+
 @struct.definition()
 class Geometry(struct.Struct):
 
+    __cache__ = None
+
+    def _set_items(self, **kwargs):
+        self.__cache__ = {}  # copies share the cache dict of the original until their items are set
+        struct.Struct._set_items(self, **kwargs)
+
+    def __validate__(self):
+        self.__cache__ = {}  # validation may replace item values
+        struct.Struct.__validate__(self)
+
     @property
     def center(self):
         raise NotImplementedError()
@@ -70,12 +106,38 @@ class Geometry(struct.Struct):
         :return: fraction of cell volume lying inside the geometry. float tensor of shape (other_geometry.batch_shape, 1).
         """
         assert isinstance(other_geometry, Geometry)
-        radius = other_geometry.bounding_radius()
-        location = other_geometry.center
-        distance = self.approximate_signed_distance(location)
-        inside_fraction = 0.5 - distance / radius
-        inside_fraction = math.clip(inside_fraction, 0, 1)
-        return inside_fraction
+        return self.approximate_fraction_inside_batch(other_geometry.center, other_geometry.bounding_radius())
+
+    def approximate_fraction_inside_batch(self, centers, radii):
+        """
+        Computes the approximate overlap between the geometry and a batch of small spheres.
+        This is the sphere approximation used by `approximate_fraction_inside()` operating directly on tensors.
+        Callers that query the same cells repeatedly can precompute `centers` and `radii` once instead of constructing Geometry instances.
+
+        :param centers: float tensor of shape (batch_size, ..., rank)
+        :param radii: float tensor broadcastable to shape (batch_size, ..., 1)
+        :return: fraction of sphere volume lying inside the geometry. float tensor of shape (*centers.shape[:-1], 1).
+        """
+        distance = self.approximate_signed_distance(centers)
+        return math.clip(0.5 - distance / radii, 0, 1)
+
+    def approximate_fraction_inside_grid(self, cells):
+        """
+        Computes the fraction of each cell volume that lies inside this geometry.
+        Each cell is sampled at the 2^rank points of a two-point Gauss-Legendre rule per axis and all samples are tested in one batched `lies_inside()` call.
+
+        Unlike `approximate_fraction_inside()`, this takes the box shape of the cells into account and does not rely on `approximate_signed_distance()` being accurate.
+        The result is piecewise constant and therefore not differentiable w.r.t. the geometry.
+
+        :param cells: (batched) box-like Geometry with `center` and `half_size`, e.g. the `elements` of a CenteredGrid
+        :return: fraction of cell volume lying inside the geometry. float tensor of shape (*cells.center.shape[:-1], 1).
+        """
+        center = cells.center
+        rank = math.staticshape(center)[-1]
+        offsets = np.array(list(itertools.product((-1, 1), repeat=rank)), np.float32) / np.sqrt(3)
+        points = math.expand_dims(center, -2) + offsets * math.expand_dims(cells.half_size, -2)
+        inside = math.to_float(self.lies_inside(points))
+        return math.mean(inside, axis=-2)
 
     def bounding_radius(self):
         """
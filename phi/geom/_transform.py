@@ -2,7 +2,7 @@ import warnings
 
 from phi import struct, math
 from phi.geom import GLOBAL_AXIS_ORDER
-from ._geom import Geometry
+from ._geom import Geometry, cached
 from ._sphere import Sphere
 
 
@@ -57,6 +57,7 @@ class RotatedGeometry(Geometry):
     def bounding_radius(self):
         return self.geometry.bounding_radius()
 
+    @cached
     def bounding_half_extent(self):
         bounding_sphere = Sphere(self.center, self.bounding_radius())
         return bounding_sphere.bounding_half_extent()
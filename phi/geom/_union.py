@@ -1,5 +1,5 @@
 from phi import struct, math
-from ._geom import Geometry
+from ._geom import Geometry, cached
 from ._empty import NO_GEOMETRY
 from ._transform import rotate
 from ._box import bounding_box, AABox
@@ -39,6 +39,7 @@ class Union(Geometry):
     def bounding_half_extent(self):
         return self._bounding_box().bounding_half_extent()
 
+    @cached
     def _bounding_box(self):
         boxes = [bounding_box(g) for g in self.geometries]
         lower = math.min([b.lower for b in boxes], axis=0)
@@ -1,4 +1,5 @@
 # coding=utf-8
+import functools
 import itertools
 
 import numpy as np
@@ -10,6 +11,29 @@ from phi.physics.field import ConstantField, StaggeredGrid
 from .field import Field, StaggeredSamplePoints
 from .grid import CenteredGrid
 
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+@functools.lru_cache(maxsize=None)
+def _direction_stencils(rank):
+    """
+Direction stencils for the given spatial rank, in itertools.product order.
+Built once per rank and shared between calls, so the arrays are read-only.
+    :param rank: spatial rank
+    :return: int arrays of shape (directions, rank): all 3^rank directions, all but (0,...,0), axis directions only, positive axis directions only
+    """
+    directions = np.array(list(itertools.product(*[(-1, 0, 1)] * rank)))
+    stencils = (directions,
+                directions[np.any(directions != 0, axis=1)],
+                directions[np.sum(np.abs(directions), axis=1) == 1],
+                directions[np.all(directions >= 0, axis=1) & (np.sum(directions, axis=1) == 1)])
+    for stencil in stencils:
+        stencil.flags.writeable = False
+    return stencils
+
 
 def diffuse(field, amount, substeps=1):
     u"""
@@ -66,13 +90,14 @@ def staggered_curl_2d(grid, pad_width=(1, 2)):
     return StaggeredGrid(vector_field, box=grid.box)
 
 
-def extrapolate(input_field, valid_mask, voxel_distance=10):
+def extrapolate(input_field, valid_mask, voxel_distance=10, diagonals=True):
     """
     Create a signed distance field for the grid, where negative signs are fluid cells and positive signs are empty cells. The fluid surface is located at the points where the interpolated value is zero. Then extrapolate the input field into the air cells.
         :param domain: Domain that can create new Fields
         :param input_field: Field to be extrapolated
         :param valid_mask: One dimensional binary mask indicating where fluid is present
         :param voxel_distance: Optional maximal distance (in number of grid cells) where signed distance should still be calculated / how far should be extrapolated.
+        :param diagonals: If True, cells are updated from all 3^rank - 1 neighbours. If False, only the 2·rank axis neighbours are used which is cheaper but yields Manhattan instead of (approximately) Euclidean distances away from the axes.
         :return: ext_field: a new Field with extrapolated values, s_distance: tensor containing signed distance field, depending only on the valid_mask
     """
     ext_data = input_field.data
@@ -92,16 +117,11 @@ def extrapolate(input_field, valid_mask, voxel_distance=10):
     # Previously initialized with -0.5*dx, i.e. the cell is completely full (center is 0.5*dx inside the fluid surface). For stability and looks this was changed to 0 * dx, i.e. the cell is only half full. This way small changes to the SDF won't directly change neighbouring empty cells to fluid cells.
     s_distance = math.where((surface_mask >= 1), -0.0 * math.ones_like(s_distance), s_distance)
 
-    directions = np.array(list(itertools.product(
-        *np.tile((-1, 0, 1), (len(dims), 1))
-    )))
-
     # First make a move in every positive direction (StaggeredGrid velocities there are correct, we want to extrapolate these)
     if isinstance(input_field, StaggeredGrid):
-        for d in directions:
-            if (d <= 0).all():
-                continue
-
+        # Pure axis directions (1,0,0), (0,1,0), (0,0,1)
+        positive_axis_directions = _direction_stencils(len(dims))[3]
+        for d, step_length in zip(positive_axis_directions, _step_lengths(dx, positive_axis_directions).tolist()):
             # Shift the field in direction d, compare new distances to old ones.
             d_slice = tuple(
                 [(slice(1, None) if d[i] == -1 else slice(0, -1) if d[i] == 1 else slice(None)) for i in dims])
@@ -115,46 +135,23 @@ def extrapolate(input_field, valid_mask, voxel_distance=10):
                               [[0, 0]] + [([0, 1] if d[i] == -1 else [1, 0] if d[i] == 1 else [0, 0]) for i in dims] + [
                                   [0, 0]], "symmetric")
             d_dist = d_dist[(slice(None),) + d_slice + (slice(None),)]
-            d_dist += np.sqrt((dx * d).dot(dx * d)) * signs
-
-            if (d.dot(d) == 1) and (d >= 0).all():
-                # Pure axis direction (1,0,0), (0,1,0), (0,0,1)
-                updates = (math.abs(d_dist) < math.abs(s_distance)) & (surface_mask <= 0)
-                updates_velocity = updates & (signs > 0)
-                ext_data = math.where(
-                    math.concat([(math.zeros_like(updates_velocity) if d[i] == 1 else updates_velocity) for i in dims],
-                                axis=-1), d_field, ext_data)
-                s_distance = math.where(updates, d_dist, s_distance)
-            else:
-                # Mixed axis direction (1,1,0), (1,1,-1), etc.
-                continue
+            d_dist += step_length * signs
 
-    for _ in range(voxel_distance):
-        buffered_distance = 1.0 * s_distance  # Create a copy of current voxel_distance. This should not be necessary...
-        for d in directions:
-            if (d == 0).all():
-                continue
-
-            # Shift the field in direction d, compare new distances to old ones.
-            d_slice = tuple(
-                [(slice(1, None) if d[i] == -1 else slice(0, -1) if d[i] == 1 else slice(None)) for i in dims])
-
-            d_field = math.pad(ext_data,
-                               [[0, 0]] + [([0, 1] if d[i] == -1 else [1, 0] if d[i] == 1 else [0, 0]) for i in
-                                           dims] + [[0, 0]], "symmetric")
-            d_field = d_field[(slice(None),) + d_slice + (slice(None),)]
-
-            d_dist = math.pad(s_distance, [[0, 0]] + [([0, 1] if d[i] == -1 else [1, 0] if d[i] == 1 else [0, 0]) for i in dims] + [[0, 0]], "symmetric")
-            d_dist = d_dist[(slice(None),) + d_slice + (slice(None),)]
-            d_dist += np.sqrt((dx * d).dot(dx * d)) * signs
-
-            # We only want to update velocity that is outside of fluid
-            updates = (math.abs(d_dist) < math.abs(buffered_distance)) & (surface_mask <= 0)
+            updates = (math.abs(d_dist) < math.abs(s_distance)) & (surface_mask <= 0)
             updates_velocity = updates & (signs > 0)
-            ext_data = math.where(math.concat([updates_velocity] * math.spatial_rank(ext_data), axis=-1), d_field, ext_data)
-            buffered_distance = math.where(updates, d_dist, buffered_distance)
-
-        s_distance = buffered_distance
+            ext_data = math.where(
+                math.concat([(math.zeros_like(updates_velocity) if d[i] == 1 else updates_velocity) for i in dims],
+                            axis=-1), d_field, ext_data)
+            s_distance = math.where(updates, d_dist, s_distance)
+
+    _, neighbour_directions, axis_directions, _ = _direction_stencils(len(dims))
+    directions = neighbour_directions if diagonals else axis_directions
+    if numba is not None and isinstance(ext_data, np.ndarray) and isinstance(s_distance, np.ndarray):
+        ext_data, s_distance = _extrapolate_numba(ext_data, s_distance, signs, surface_mask, dx, directions, voxel_distance)
+    elif isinstance(ext_data, np.ndarray) and isinstance(s_distance, np.ndarray):
+        ext_data, s_distance = _extrapolate_numpy(ext_data, s_distance, signs, surface_mask, dx, directions, voxel_distance)
+    else:
+        ext_data, s_distance = _extrapolate_math(ext_data, s_distance, signs, surface_mask, dx, directions, voxel_distance)
 
     # Cut off inaccurate values
     distance_limit = -voxel_distance * (2 * valid_mask - 1)
@@ -170,6 +167,200 @@ def extrapolate(input_field, valid_mask, voxel_distance=10):
     return ext_field, s_distance
 
 
+def _step_lengths(dx, directions):
+    """
+Physical distance to the neighbour in each of the `directions` (int array of shape (neighbours, rank)) for cell size `dx`.
+Adding these float64 lengths to the distance field would promote it, so callers convert them first:
+NumPy implementations cast them to the distance dtype, backend-agnostic code uses Python floats via `tolist()` which keep the dtype of any tensor.
+    """
+    return np.sqrt(np.sum((dx * directions) ** 2, axis=-1))
+
+
+def _extrapolate_math(ext_data, s_distance, signs, surface_mask, dx, directions, voxel_distance):
+    """ Backend-agnostic sweep loop of `extrapolate()`, used for TensorFlow graphs and other non-NumPy tensors. """
+    dims = range(len(dx))
+    # Stage the direction-dependent pad widths, slices and distance increments once instead of in every iteration
+    step_signs = {}
+    stencil = []
+    for d, step_length in zip(directions, _step_lengths(dx, directions).tolist()):
+        pad_width = [[0, 0]] + [([0, 1] if d[i] == -1 else [1, 0] if d[i] == 1 else [0, 0]) for i in dims] + [[0, 0]]
+        d_slice = (slice(None),) + tuple([(slice(1, None) if d[i] == -1 else slice(0, -1) if d[i] == 1 else slice(None)) for i in dims]) + (slice(None),)
+        padded_slice = (slice(None),) + tuple([(slice(2, None) if d[i] == -1 else slice(0, -2) if d[i] == 1 else slice(1, -1)) for i in dims]) + (slice(None),)
+        if step_length not in step_signs:
+            step_signs[step_length] = step_length * signs
+        stencil.append((pad_width, d_slice, padded_slice, step_signs[step_length]))
+    # We only want to update velocity that is outside of fluid
+    not_surface = surface_mask <= 0
+    outside = signs > 0
+
+    def sweep(ext_data, s_distance, _changed):
+        buffered_distance = s_distance  # No copy needed, all updates below create new tensors and s_distance is never modified in-place
+        # s_distance is constant during an iteration, so it is padded once and every direction reads a (zero-copy) slice of it
+        padded_distance = math.pad(s_distance, [[0, 0]] + [[1, 1]] * len(dims) + [[0, 0]], "symmetric")
+        for pad_width, d_slice, padded_slice, d_step in stencil:
+            # Shift the field in direction d, compare new distances to old ones.
+            d_field = math.pad(ext_data, pad_width, "symmetric")[d_slice]
+            d_dist = padded_distance[padded_slice] + d_step
+
+            updates = (math.abs(d_dist) < math.abs(buffered_distance)) & not_surface
+            updates_velocity = updates & outside
+            ext_data = math.where(updates_velocity, d_field, ext_data)  # the single-component mask broadcasts against all components
+            buffered_distance = math.where(updates, d_dist, buffered_distance)
+        # Updates strictly decrease |distance| and ext_data only changes along with it. Once nothing changes, further iterations are no-ops.
+        changed = math.any(math.abs(buffered_distance) < math.abs(s_distance))
+        return [ext_data, buffered_distance, changed]
+
+    ext_data, s_distance, _ = math.while_loop(lambda _ext_data, _s_distance, changed: changed, sweep, [ext_data, s_distance, True], name='extrapolate', maximum_iterations=voxel_distance)
+    return ext_data, s_distance
+
+
+def _extrapolate_numpy(ext_data, s_distance, signs, surface_mask, dx, directions, voxel_distance):
+    """
+NumPy implementation of the sweep loop of `_extrapolate_math()`, used when Numba is not installed.
+`ext_data` and `s_distance` are kept inside padded buffers whose borders replicate the edge values (symmetric padding by one cell).
+Shifted neighbours are views of these buffers and all updates are written in-place so no grid-sized arrays are allocated per direction.
+    """
+    rank = len(dx)
+    cell_shape = ext_data.shape[:-1] + (1,)
+    step_signs = {}
+    stencil = []
+    for d, step_length in zip(directions, _step_lengths(dx, directions).astype(s_distance.dtype)):
+        padded_slice = (slice(None),) + tuple([(slice(2, None) if d[i] == -1 else slice(0, -2) if d[i] == 1 else slice(1, -1)) for i in range(rank)]) + (slice(None),)
+        if step_length not in step_signs:
+            step_signs[step_length] = step_length * signs
+        stencil.append((padded_slice, step_signs[step_length]))
+    dtype = s_distance.dtype
+    interior = (slice(None),) + (slice(1, -1),) * rank + (slice(None),)
+    padded_data = np.empty((ext_data.shape[0],) + tuple(n + 2 for n in ext_data.shape[1:-1]) + (ext_data.shape[-1],), ext_data.dtype)
+    padded_distance = np.empty(padded_data.shape[:-1] + (1,), dtype)
+    padded_data[interior] = ext_data
+    padded_distance[interior] = s_distance
+    _replicate_edges(padded_data)
+    _replicate_edges(padded_distance)
+    ext_data = padded_data[interior]
+    buffered_distance = padded_distance[interior].copy()
+    # We only want to update velocity that is outside of fluid
+    not_surface = np.broadcast_to(surface_mask <= 0, cell_shape)
+    outside = np.broadcast_to(signs > 0, cell_shape)
+    d_dist = np.empty(cell_shape, dtype)
+    abs_d_dist = np.empty(cell_shape, dtype)
+    abs_buffered = np.empty(cell_shape, dtype)
+    updates = np.empty(cell_shape, np.bool_)
+    updates_velocity = np.empty(cell_shape, np.bool_)
+    for _ in range(voxel_distance):
+        changed = False
+        for padded_slice, d_step in stencil:
+            # Shift the field in direction d, compare new distances to old ones.
+            np.add(padded_distance[padded_slice], d_step, out=d_dist)
+            np.less(np.abs(d_dist, out=abs_d_dist), np.abs(buffered_distance, out=abs_buffered), out=updates)
+            np.logical_and(updates, not_surface, out=updates)
+            np.copyto(buffered_distance, d_dist, where=updates)
+            # Only a small fraction of cells changes per direction, so values are gathered for these cells rather than masking the whole grid
+            velocity_cells = np.nonzero(np.logical_and(updates, outside, out=updates_velocity)[..., 0])
+            if len(velocity_cells[0]) > 0:
+                ext_data[velocity_cells] = padded_data[padded_slice][velocity_cells]  # gathered before assignment, so all neighbours are read before the update
+                _replicate_edges(padded_data)
+            changed = changed or updates.any()
+        if not changed:
+            break
+        padded_distance[interior] = buffered_distance
+        _replicate_edges(padded_distance)
+    return ext_data, buffered_distance
+
+
+def _replicate_edges(padded):
+    """ Fills the one-cell border of the spatial dimensions of `padded` with the adjacent interior values, in-place. """
+    for axis in range(1, len(padded.shape) - 1):
+        leading = (slice(None),) * axis
+        padded[leading + (0,)] = padded[leading + (1,)]
+        padded[leading + (-1,)] = padded[leading + (-2,)]
+
+
+def _extrapolate_numba(ext_data, s_distance, signs, surface_mask, dx, directions, voxel_distance):
+    """ NumPy implementation of the sweep loop of `extrapolate()` that runs the Numba kernel `_sweep()`. """
+    batch_size, component_count = ext_data.shape[0], ext_data.shape[-1]
+    step_lengths = _step_lengths(dx, directions).astype(s_distance.dtype)
+    cell_shape = ext_data.shape[:-1] + (1,)
+    flat_data = np.array(ext_data).reshape((batch_size, -1, component_count))
+    flat_distance = np.broadcast_to(s_distance, cell_shape).reshape((batch_size, -1)).copy()
+    outside = np.broadcast_to(signs > 0, cell_shape).reshape((batch_size, -1))
+    surface = np.broadcast_to(surface_mask >= 1, cell_shape).reshape((batch_size, -1))
+    shape = np.array(ext_data.shape[1:-1], np.int64)
+    _sweep(flat_data, flat_distance, outside, surface, shape, directions.astype(np.int64), step_lengths, voxel_distance)
+    return flat_data.reshape(ext_data.shape), flat_distance.reshape(cell_shape)
+
+
+if numba is not None:
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def _sweep(ext_data, s_distance, outside, surface, shape, directions, step_lengths, max_iterations):
+        """
+Native implementation of the sweep loop of `_extrapolate_math()`. `ext_data` and `s_distance` are updated in-place.
+Each direction is scanned in reverse order along its positive axes so that every neighbour is read before it is updated in the same pass.
+This reproduces the shift-and-compare results exactly without allocating shifted copies of the grid.
+Out-of-bounds neighbours are clamped to the grid which corresponds to the symmetric padding used by `_extrapolate_math()`.
+        :param ext_data: float array of shape (batch_size, cells, components)
+        :param s_distance: float array of shape (batch_size, cells)
+        :param outside: bool array of shape (batch_size, cells), True for cells outside the fluid which receive extrapolated values
+        :param surface: bool array of shape (batch_size, cells), True for surface cells which are kept fixed
+        :param shape: spatial resolution of the grid
+        :param directions: int array of shape (neighbours, rank). Cells are updated from the neighbour at `index - direction`.
+        :param step_lengths: physical distance to the neighbour in each direction, same dtype as `s_distance`
+        :param max_iterations: maximum number of iterations, stops early once no cell changes
+        """
+        rank = shape.shape[0]
+        row_length = shape[rank - 1]
+        strides = np.ones(rank, np.int64)
+        for axis in range(rank - 2, -1, -1):
+            strides[axis] = strides[axis + 1] * shape[axis + 1]
+        for b in numba.prange(s_distance.shape[0]):
+            index = np.empty(rank, np.int64)
+            distance = s_distance[b]
+            buffered_distance = distance.copy()
+            for _ in range(max_iterations):
+                changed = False
+                for k in range(directions.shape[0]):
+                    step = directions[k, rank - 1]
+                    for axis in range(rank - 1):
+                        index[axis] = shape[axis] - 1 if directions[k, axis] > 0 else 0
+                    for _row in range(distance.shape[0] // row_length):
+                        row = 0
+                        source_row = 0
+                        for axis in range(rank - 1):
+                            row += index[axis] * strides[axis]
+                            source_row += min(max(index[axis] - directions[k, axis], 0), shape[axis] - 1) * strides[axis]
+                        for j in range(row_length):
+                            if step > 0:
+                                j = row_length - 1 - j
+                            cell = row + j
+                            if surface[b, cell]:
+                                continue
+                            neighbour = source_row + min(max(j - step, 0), row_length - 1)
+                            if outside[b, cell]:
+                                candidate = distance[neighbour] + step_lengths[k]
+                            else:
+                                candidate = distance[neighbour] - step_lengths[k]
+                            if abs(candidate) < abs(buffered_distance[cell]):
+                                buffered_distance[cell] = candidate
+                                changed = True
+                                if outside[b, cell]:
+                                    ext_data[b, cell, :] = ext_data[b, neighbour, :]
+                        # Advance to the next row, counting down along positive axes of the direction
+                        for axis in range(rank - 2, -1, -1):
+                            if directions[k, axis] > 0:
+                                index[axis] -= 1
+                                if index[axis] >= 0:
+                                    break
+                                index[axis] = shape[axis] - 1
+                            else:
+                                index[axis] += 1
+                                if index[axis] < shape[axis]:
+                                    break
+                                index[axis] = 0
+                distance[:] = buffered_distance
+                if not changed:
+                    break
+
+
 def create_surface_mask(liquid_mask):
     """
 Computes inner contours of the liquid_mask.
@@ -178,22 +369,12 @@ A cell i is flagged 1 if liquid_mask[i] = 1 and it has a non-liquid neighbour.
     :return: tensor
     """
     # When we create inner contour, we don't want the fluid-wall boundaries to show up as surface, so we should pad with symmetric edge values.
-    mask = math.pad(liquid_mask, [[0, 0]] + [[1, 1]] * math.spatial_rank(liquid_mask) + [[0, 0]], "constant")
-    dims = range(math.spatial_rank(mask))
-    bcs = math.zeros_like(liquid_mask)
-
-    # Move in every possible direction to assure corners are properly set.
-    directions = np.array(list(itertools.product(
-        *np.tile((-1, 0, 1), (len(dims), 1))
-    )))
-
-    for d in directions:
-        d_slice = tuple([(slice(2, None) if d[i] == -1 else slice(0, -2) if d[i] == 1 else slice(1, -1)) for i in dims])
-        center_slice = tuple([slice(1, -1) for _ in dims])
-
-        # Create inner contour of particles
-        bc_d = math.maximum(mask[(slice(None),) + d_slice + (slice(None),)],
-                            mask[(slice(None),) + center_slice + (slice(None),)]) - \
-            mask[(slice(None),) + d_slice + (slice(None),)]
-        bcs = math.maximum(bcs, bc_d)
-    return bcs
+    eroded = math.pad(liquid_mask, [[0, 0]] + [[1, 1]] * math.spatial_rank(liquid_mask) + [[0, 0]], "constant")
+    dims = range(math.spatial_rank(eroded))
+
+    # The inner contour is max_d(max(mask[i+d], mask[i]) - mask[i+d]) = mask[i] - min_d(mask[i+d]) over all 3^rank directions d.
+    # The minimum over the neighbourhood is separable, so it is computed with one 3-wide pass per axis.
+    for axis in dims:
+        lower, center, upper = [(slice(None),) * (axis + 1) + (axis_slice,) for axis_slice in (slice(0, -2), slice(1, -1), slice(2, None))]
+        eroded = math.minimum(math.minimum(eroded[lower], eroded[center]), eroded[upper])
+    return liquid_mask - eroded
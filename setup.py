@@ -279,5 +279,6 @@ setup(
                 'dash-core-components',
                 'plotly',
                 'imageio'],
+        'numba': ['numba'],
     }
 )
@@ -1,4 +1,4 @@
-from unittest import TestCase
+from unittest import TestCase, mock, skipIf
 
 import numpy as np
 
@@ -8,6 +8,7 @@ from phi.geom import box, AABox
 from phi.physics.field import CenteredGrid, Field, unstack_staggered_tensor, StaggeredGrid, data_bounds, ConstantField, Noise, staggered_curl_2d
 from phi.physics.field.flag import SAMPLE_POINTS
 from phi.physics.field.staggered_grid import stack_staggered_components
+from phi.physics.field import util
 from phi.physics.fluid import Fluid
 
 
@@ -117,3 +118,56 @@ class TestFields(TestCase):
         vel = staggered_curl_2d(pot)
         div = vel.divergence()
         np.testing.assert_almost_equal(div.data, 0, decimal=3)
+
+    @skipIf(util.numba is None, 'Numba is not installed')
+    def test_extrapolate_numba(self):
+        mask = np.zeros([2, 8, 10, 1], np.float32)
+        mask[0, 2:5, 3:8, :] = 1
+        mask[1, 1:4, 1:4, :] = mask[1, 5:7, 4:9, :] = 1
+        velocity = StaggeredGrid(np.random.randn(2, 9, 11, 2), box[0:8, 0:10])
+        for field in (velocity, velocity.at_centers()):
+            ext_field, s_distance = util.extrapolate(field, mask, voxel_distance=3)
+            with mock.patch.object(util, 'numba', None):
+                ext_field_math, s_distance_math = util.extrapolate(field, mask, voxel_distance=3)
+            np.testing.assert_equal(s_distance, s_distance_math)
+            for component, component_math in zip(ext_field.unstack(), ext_field_math.unstack()):
+                np.testing.assert_equal(component.data, component_math.data)
+
+    def test_extrapolate_axis_directions(self):
+        mask = np.zeros([1, 7, 7, 1], np.float32)
+        mask[0, 3, 3, 0] = 1
+        field = CenteredGrid(np.random.randn(1, 7, 7, 1), box[0:7, 0:7])
+        _, s_distance = util.extrapolate(field, mask, voxel_distance=6)
+        np.testing.assert_almost_equal(s_distance[0, 4, 4, 0], np.sqrt(2))
+        ext_field, s_distance = util.extrapolate(field, mask, voxel_distance=6, diagonals=False)
+        np.testing.assert_almost_equal(s_distance[0, 4, 4, 0], 2)
+        np.testing.assert_almost_equal(s_distance[0, 3, 5, 0], 2)
+        np.testing.assert_equal(ext_field.data, field.data[:, 3:4, 3:4, :] * np.ones_like(field.data))
+        with mock.patch.object(util, 'numba', None):
+            ext_field_math, s_distance_math = util.extrapolate(field, mask, voxel_distance=6, diagonals=False)
+        np.testing.assert_equal(s_distance, s_distance_math)
+        np.testing.assert_equal(ext_field.data, ext_field_math.data)
+
+    def test_extrapolate_numpy(self):
+        mask = np.zeros([2, 6, 8, 5, 1], np.float32)
+        mask[0, 1:4, 2:6, 1:3, :] = 1
+        mask[1, 3:6, 0:3, 2:5, :] = 1
+        velocity = StaggeredGrid(np.random.randn(2, 7, 9, 6, 3), box[0:6, 0:8, 0:5])
+        for field in (velocity, velocity.at_centers()):
+            with mock.patch.object(util, 'numba', None):
+                ext_field, s_distance = util.extrapolate(field, mask, voxel_distance=3)
+                with mock.patch.object(util, '_extrapolate_numpy', util._extrapolate_math):
+                    ext_field_math, s_distance_math = util.extrapolate(field, mask, voxel_distance=3)
+            self.assertEqual(s_distance.dtype, mask.dtype)
+            self.assertEqual(s_distance_math.dtype, mask.dtype)
+            np.testing.assert_equal(s_distance, s_distance_math)
+            for component, component_math in zip(ext_field.unstack(), ext_field_math.unstack()):
+                np.testing.assert_equal(component.data, component_math.data)
+
+    def test_extrapolate_rank_5(self):
+        mask = np.zeros([1, 3, 3, 3, 3, 3, 1], np.float32)
+        mask[0, 1, 1, 1, 1, 1, 0] = 1
+        field = CenteredGrid(np.random.randn(1, 3, 3, 3, 3, 3, 1), box[0:3, 0:3, 0:3, 0:3, 0:3])
+        ext_field, s_distance = util.extrapolate(field, mask, voxel_distance=4)
+        np.testing.assert_almost_equal(s_distance[0, 0, 0, 0, 0, 0, 0], np.sqrt(5), decimal=5)
+        np.testing.assert_equal(ext_field.data, field.data[:, 1:2, 1:2, 1:2, 1:2, 1:2, :] * np.ones_like(field.data))
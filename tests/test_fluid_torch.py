@@ -1,6 +1,7 @@
 from unittest import TestCase
 
-from phi.torch.flow import torch, torch_from_numpy, World, Fluid, IncompressibleFlow, Obstacle, CLOSED, Inflow, Domain, Sphere, box, OPEN, STICKY, SLIPPERY, PERIODIC, Noise, struct, numpy, math
+from phi.torch.flow import torch, torch_from_numpy, World, Fluid, IncompressibleFlow, Obstacle, CLOSED, Inflow, Domain, Sphere, box, OPEN, STICKY, SLIPPERY, PERIODIC, Noise, struct, numpy, math, StaggeredGrid
+from phi.physics.field.util import extrapolate
 
 
 class TestFluidPyTorch(TestCase):
@@ -34,6 +35,19 @@ class TestFluidPyTorch(TestCase):
                     torch_eval = torch_tensor.numpy()
                     numpy.testing.assert_almost_equal(np_tensor, torch_eval, decimal=5)
 
+    def test_extrapolate_pytorch(self):
+        mask = numpy.zeros([2, 6, 7, 1], numpy.float32)
+        mask[0, 2:4, 2:5, :] = 1
+        mask[1, 0:3, 4:7, :] = 1
+        velocity = StaggeredGrid(numpy.random.randn(2, 7, 8, 2).astype(numpy.float32), box[0:6, 0:7])
+        for field in (velocity, velocity.at_centers()):
+            np_field, np_distance = extrapolate(field, mask, voxel_distance=3)
+            torch_field, torch_distance = extrapolate(torch_from_numpy(field), torch.from_numpy(mask), voxel_distance=3)
+            self.assertEqual(torch_distance.dtype, torch.float32)
+            numpy.testing.assert_almost_equal(np_distance, torch_distance.numpy(), decimal=5)
+            for np_tensor, torch_tensor in zip(struct.flatten(np_field), struct.flatten(torch_field)):
+                numpy.testing.assert_almost_equal(np_tensor, torch_tensor.numpy(), decimal=5)
+
     def test_precision_64(self):
         try:
             math.set_precision(64)
@@ -2,7 +2,7 @@ from unittest import TestCase
 
 import numpy as np
 
-from phi.geom import AABox, Sphere, box
+from phi.geom import AABox, Sphere, box, union
 from phi.physics.field import CenteredGrid
 
 
@@ -38,3 +38,34 @@ class TestGeometry(TestCase):
         values = growing_sphere.value_at(np.zeros([10, 3, 2]) + [0, 4])
         np.testing.assert_equal(values.shape, [10, 3, 1])
         np.testing.assert_equal(values[:, 0, 0], [0, 0, 0, 0, 1, 1, 1, 1, 1, 1])
+
+    def test_approximate_fraction_inside_batch(self):
+        sphere = Sphere(center=[5, 5], radius=2)
+        cells = CenteredGrid(np.zeros([1, 10, 10, 1]), box[0:10, 0:10]).elements
+        fraction = sphere.approximate_fraction_inside(cells)
+        np.testing.assert_equal(fraction.shape, [1, 10, 10, 1])
+        np.testing.assert_equal(fraction, sphere.approximate_fraction_inside_batch(cells.center, cells.bounding_radius()))
+        np.testing.assert_equal(fraction[0, 4:6, 4:6, 0], 1)
+        np.testing.assert_equal(fraction[0, 0, 0, 0], 0)
+        np.testing.assert_equal(union().approximate_fraction_inside(cells), 0)
+
+    def test_cached_properties(self):
+        mybox = AABox([0, 0], [2, 4])
+        self.assertIs(mybox.bounding_radius(), mybox.bounding_radius())
+        self.assertIs(mybox.center, mybox.center)
+        np.testing.assert_equal(mybox.center, [1, 2])
+        shifted = mybox.shifted([1, 1])
+        np.testing.assert_equal(shifted.center, [2, 3])
+        np.testing.assert_equal(mybox.center, [1, 2])
+        np.testing.assert_equal(mybox.copied_with(upper=[4, 4]).bounding_half_extent(), [2, 2])
+
+    def test_approximate_fraction_inside_grid(self):
+        cells = CenteredGrid(np.zeros([1, 10, 10, 1]), box[0:10, 0:10]).elements
+        fraction = box[2:5, 3:8].approximate_fraction_inside_grid(cells)
+        np.testing.assert_equal(fraction.shape, [1, 10, 10, 1])
+        np.testing.assert_equal(fraction[0, 2:5, 3:8, 0], 1)
+        np.testing.assert_equal(np.sum(fraction), 15)
+        fraction = box[2:5.5, 3:8].approximate_fraction_inside_grid(cells)
+        np.testing.assert_equal(fraction[0, 5, 3:8, 0], 0.5)
+        fraction = Sphere(center=[5, 5], radius=3).approximate_fraction_inside_grid(cells)
+        np.testing.assert_allclose(np.sum(fraction), np.pi * 9, rtol=0.05)